@@ -44,15 +44,75 @@ Classes available so far:
     ACLEntry
 """
 
-__version__ = "2.1.1"
+__version__ = "3.0.0"
 
-import win32com.client
+import collections
+import itertools
+import operator
+import sys
+import threading
+import types
 
 # -------------------------------------------------------------------
 
 class NotesLibError(Exception): pass
 class SessionError(NotesLibError): pass
 class DatabaseError(NotesLibError): pass
+# Also an AttributeError, so hasattr() and getattr() with a default still
+# work on a closed Database.
+class DatabaseClosedError(DatabaseError, AttributeError): pass
+
+# -------------------------------------------------------------------
+
+class _Delegated:
+    """Class-level forwarder for one Notes property or method name.
+
+    __getattr__ only runs after normal lookup has failed, which costs a full
+    lookup plus a raised and caught AttributeError on every access. Once a
+    name has been resolved through __getattr__, an instance of this
+    descriptor is put on the wrapper class, so normal lookup finds the name
+    straight away from then on.
+
+    Bound methods are also remembered in the wrapper's instance __dict__,
+    when it has one. Property values are never remembered, since Notes may
+    change them at any time. This is a non-data descriptor, so on Session
+    and Database objects assigning to the attribute still stores the value
+    on the wrapper, as it always has. ACLEntry objects have no instance
+    __dict__ (see its __slots__), so assigning there raises AttributeError.
+    """
+
+    __slots__ = ("name", "handleAttr")
+
+    def __init__(self, name, handleAttr):
+        self.name = name
+        self.handleAttr = handleAttr
+
+    def __get__(self, wrapper, owner=None):
+        if wrapper is None:
+            return self
+        handle = getattr(wrapper, self.handleAttr)
+        try:
+            value = getattr(handle, self.name)
+        except AttributeError:
+            # Early-bound wrappers only know the exact spelling of each name.
+            # Retry late-bound, which ignores case, as Notes names always did.
+            oleobj = getattr(handle, "_oleobj_", None)
+            if oleobj is None or self.name.startswith("_"):
+                raise
+            import win32com.client.dynamic
+            value = getattr(win32com.client.dynamic.Dispatch(oleobj), self.name)
+        # __dictoffset__ is 0 for classes whose instances have no __dict__ (slots).
+        if isinstance(value, types.MethodType) and type(wrapper).__dictoffset__:
+            wrapper.__dict__[self.name] = value
+        return value
+
+def _delegate(wrapper, name, handleAttr):
+    """Get name from the wrapper's Notes object, via a new _Delegated on its class."""
+    delegated = _Delegated(name, handleAttr)
+    value = delegated.__get__(wrapper)
+    if not name.startswith("_"):
+        setattr(type(wrapper), name, delegated)
+    return value
 
 # -------------------------------------------------------------------
 
@@ -73,6 +133,18 @@ or
 The password is optional; if you don't provide it, Notes will prompt you
 for a password.
 
+Session uses early-bound COM wrappers generated from the Notes type
+library (win32com.client.gencache). The first connection generates them,
+so it needs write access to the gen_py cache directory; later connections
+reuse them. If the wrappers can't be generated, Session falls back to
+late-bound COM.
+
+Names are case-insensitive either way, as they always were. Early-bound
+wrappers only know the documented spelling, so a name like db.title or
+s.commonusername is retried through late-bound COM, which costs a little
+more on each use. Spelling names as in the LotusScript documentation
+(db.Title, s.CommonUserName) keeps every access early-bound.
+
 Example:
 
     >>> import noteslib
@@ -97,18 +169,19 @@ penalty, and you only have to establish a password once. Example:
 ################################################
 # SINGLETON - Implementation Details
 #
-# 1) The __call__ method in the Session class ensures that function-style
-# calls of a Session instance return the instance.
-#
-# 2) The line "Session = Session()" that immediately follows the Session class definition
-# creates an instance of the Session class and rebinds the name "Session" to it.
+# Session.__new__ keeps the one Session instance in the class attribute
+# __instance and returns it from every call like "s = Session()". This gives
+# us the singleton we want, and Session stays an ordinary class, so
+# isinstance() checks work and no __call__ indirection is needed.
 #
-# With these pieces in place, any assignment like "s = Session()" returns the same
-# Session instance. This gives us the singleton we want.
+# The attempt to connect to Notes happens on the first Session() call, not
+# when the class is defined, so "import noteslib" never tries to connect,
+# fail, and raise an exception. If that attempt fails, the next Session()
+# call tries again.
 #
-# The attempt to connect to Notes is in Session.__call__ rather than Session.__init__
-# so that we don't try to connect when the "Session = Session()" line executes.
-# Otherwise, "import noteslib" might try to connect, fail, and raise an exception.
+# Creating the instance and connecting happen under __lock, so threads that
+# race on the first Session() call make only one connection. Once connected,
+# Session() returns without taking the lock.
 ################################################
 
     __CONNECT_ERROR = r"""
@@ -116,31 +189,50 @@ penalty, and you only have to establish a password once. Example:
     Error connecting to Notes via COM.
     """
 
-    def __init__(self):
-        self.__handle = None
+    __instance = None
+    __lock = threading.Lock()
+
+    def __new__(cls, password=None):
+        """Return the one Session instance, connecting to Notes if needed."""
+        self = cls.__instance
+        if self is not None and self.__handle is not None:
+            return self
+        with cls.__lock:
+            self = cls.__instance
+            if self is None:
+                self = super().__new__(cls)
+                self.__handle = None
+                cls.__instance = self
+            if self.__handle is None:
+                self.__connectToNotes(password)
+        return self
 
     def __connectToNotes(self, password=None):
         """Connect to Notes via COM."""
+        # Imported here, so "import noteslib" doesn't load the COM machinery.
+        import pywintypes
+        import win32com.client
         try:
-            self.__handle = win32com.client.Dispatch("Lotus.NotesSession")
+            handle = win32com.client.Dispatch("Lotus.NotesSession")
+            try:
+                # Early binding: method and property DISPIDs come from the
+                # Notes type library instead of a GetIDsOfNames per access.
+                # Wrapping the existing object keeps it to one NotesSession.
+                handle = win32com.client.gencache.EnsureDispatch(handle._oleobj_)
+            except (AttributeError, TypeError):
+                # No usable type library, or a stale gen_py cache: stay late-bound.
+                pass
             if password:
-                self.__handle.Initialize(password)
+                handle.Initialize(password)
             else:
-                self.__handle.Initialize()
-        except:
-            raise SessionError(self.__CONNECT_ERROR)
-
-    def __call__(self, password=None):
-        """Executes when an instance is invoked as a function. Singleton support."""
-        if not self.__handle:
-            self.__connectToNotes(password)
-        return self
+                handle.Initialize()
+        except pywintypes.com_error as exc:
+            raise SessionError(self.__CONNECT_ERROR) from exc
+        self.__handle = handle
 
     def __getattr__(self, name):
         """Delegate to the Notes object to support all properties and methods."""
-        return getattr(self.__handle, name)
-
-Session = Session() # Singleton support.
+        return _delegate(self, name, "_Session__handle")
 
 # end class Session
 # -------------------------------------------------------------------
@@ -187,6 +279,21 @@ penalty. Example:
 
     a and b are different objects, but they share the same internal
     NotesDatabase object via the __handle variable.
+
+Handles stay cached until the cache fills up. To release one sooner, call
+close(), or use the Database object as a context manager:
+
+    >>> with noteslib.Database("NYNotes1", "ACLTest.nsf") as db:
+    ...     print (db.Title)
+    ...
+    ACL Test
+
+close() drops the handle from the cache and from this object. Other
+Database objects for the same database keep working with their own
+reference, and the next new Database object opens a fresh handle.
+Calling close() again does nothing; using any other attribute of a closed
+Database object raises DatabaseClosedError. It is a DatabaseError, and also
+an AttributeError, so hasattr() and getattr() with a default keep working.
     """
 
     __DB_ERROR = r"""
@@ -197,26 +304,104 @@ penalty. Example:
     read access to the database.
     """
 
-    __handleCache = {}
+    __CLOSED_ERROR = r"""
+
+    This Database object has been closed.
+
+    Create a new Database object to use it again.
+    """
+
+    # Least recently used handles are dropped once the cache is full.
+    __CACHE_SIZE = 128
+    __handleCache = collections.OrderedDict()
+    __cacheLock = threading.Lock()
+    # Per-database locks, held while a handle is being opened.
+    __openLocks = {}
+    # None until __init__ opens the database, and again after close().
+    __handle = None
 
     def __init__(self, server, dbFile, password=None):
         """Set the db handle, either from cache or via the COM connection."""
         cacheKey = ( server.lower(), dbFile.lower() )
-        cachedHandle = self.__handleCache.get(cacheKey)
-        if cachedHandle:
-            self.__handle = cachedHandle
-        else:
+        self.__cacheKey = cacheKey
+        handle = self.__cachedHandle(cacheKey)
+        if handle is None:
+            handle = self.__openHandle(server, dbFile, password, cacheKey)
+        self.__handle = handle
+
+    def __cachedHandle(self, cacheKey):
+        """Return the cached db handle, or None on a cache miss."""
+        with self.__cacheLock:
+            handle = self.__handleCache.get(cacheKey)
+            if handle is not None:
+                self.__handleCache.move_to_end(cacheKey)
+            return handle
+
+    def __openHandle(self, server, dbFile, password, cacheKey):
+        """Get the db handle via the COM connection, caching it if it's open."""
+        import pywintypes
+        # The cache lock is never held during COM calls, so opening one
+        # database doesn't hold up cache hits for the others. Threads opening
+        # the same database wait on its own lock and then reuse the handle.
+        with self.__cacheLock:
+            openLock = self.__openLocks.setdefault(cacheKey, threading.Lock())
+        with openLock:
             try:
-                s = Session(password)
-                self.__handle = s.GetDatabase(server, dbFile)
-                if self.__handle.IsOpen: # Make sure everything's okay.
-                    self.__handleCache[cacheKey] = self.__handle # Cache the handle
-            except:
-                raise DatabaseError(self.__DB_ERROR % (server, dbFile))
+                handle = self.__cachedHandle(cacheKey)
+                if handle is not None:
+                    return handle # Opened while we were waiting.
+                try:
+                    handle = Session(password).GetDatabase(server, dbFile)
+                    isOpen = handle.IsOpen # Make sure everything's okay.
+                except (SessionError, pywintypes.com_error) as exc:
+                    raise DatabaseError(self.__DB_ERROR % (server, dbFile)) from exc
+                if isOpen:
+                    with self.__cacheLock:
+                        self.__handleCache[cacheKey] = handle # Cache the handle
+                        if len(self.__handleCache) > self.__CACHE_SIZE:
+                            self.__handleCache.popitem(last=False)
+                return handle
+            finally:
+                with self.__cacheLock:
+                    if self.__openLocks.get(cacheKey) is openLock:
+                        del self.__openLocks[cacheKey]
+
+    def close(self):
+        """Release the db handle, evicting it from the cache."""
+        cacheKey = self.__cacheKey
+        if self.__handle is None:
+            return # Already closed.
+        with self.__cacheLock:
+            if self.__handleCache.get(cacheKey) is self.__handle:
+                del self.__handleCache[cacheKey]
+        # Also forget any bound methods remembered on this object.
+        self.__dict__.clear()
+        self.__cacheKey = cacheKey
+        self.__handle = None
+
+    def __eq__(self, other):
+        """Database objects are equal when they are for the same database."""
+        if self is other:
+            return True
+        if not isinstance(other, Database):
+            return NotImplemented
+        # The cache key is plain Python data, so this never goes through COM.
+        return self.__cacheKey == other.__cacheKey
+
+    def __hash__(self):
+        return hash(self.__cacheKey)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
 
     def __getattr__(self, name):
         """Delegate to the Notes object to support all properties and methods."""
-        return getattr(self.__handle, name)
+        if self.__handle is None:
+            raise DatabaseClosedError(self.__CLOSED_ERROR)
+        return _delegate(self, name, "_Database__handle")
 
 # end class Database
 # -------------------------------------------------------------------
@@ -231,6 +416,11 @@ Additional features:
 * You can print an ACL object. It knows how to format itself reasonably.
 * getAllEntries() method - Returns the ACL contents as a list of ACLEntry
     objects, sorted by Name.
+* refresh() method - Re-reads the ACL entries. Entry names are read when
+    the ACL object is created; levels, roles and flags are read the first
+    time they are used, and each entry's printed text the first time it is
+    printed. After that they don't change, so call this to see changes made
+    to the ACL since then.
 
 You don't have to create Session or Database objects first. An ACL object
 creates its own Session and Database objects automatically.
@@ -261,16 +451,30 @@ Example:
     Randy Reader
     """
 
+    # Reads each entry's precomputed sort key in C; see ACLEntry.__init__.
+    __SORT_KEY = operator.attrgetter("_ACLEntry__sortKey")
+
     def __init__(self, server, dbFile, password=None):
         """Set the ACL handle, and retrieve the ACL entries."""
-        self.__entries = []
         db = Database(server, dbFile, password)
         self.__handle = db.ACL
+        self.__loadEntries()
+
+    def __loadEntries(self):
+        """Walk the ACL into a list of ACLEntry objects, sorted by Name."""
+        self.__entries = []
+        # Bound methods as locals keep attribute lookups out of the loop.
+        getNextEntry = self.__handle.GetNextEntry
+        append = self.__entries.append
         nextEntry = self.__handle.GetFirstEntry()
         while nextEntry:
-            self.__entries.append( ACLEntry(nextEntry) )
-            nextEntry = self.__handle.GetNextEntry(nextEntry)
-        self.__entries.sort()
+            append( ACLEntry(nextEntry) )
+            nextEntry = getNextEntry(nextEntry)
+        self.__entries.sort(key=self.__SORT_KEY)
+
+    def refresh(self):
+        """Re-read the ACL entries from Notes, e.g. after changing the ACL."""
+        self.__loadEntries()
 
     def getAllEntries(self):
         """Returns a list of noteslib ACLEntry objects, sorted by Name."""
@@ -278,14 +482,11 @@ Example:
 
     def __getattr__(self, name):
         """Delegate to the Notes object to support all properties and methods."""
-        return getattr(self.__handle, name)
+        return _delegate(self, name, "_ACL__handle")
 
     def __str__(self):
         """For printing"""
-        s = ""
-        for entry in self.getAllEntries():
-            s += "%s\n" % entry
-        return s
+        return "".join("%s\n" % entry for entry in self.getAllEntries())
 
 # end class ACL
 # -------------------------------------------------------------------
@@ -300,9 +501,12 @@ Additional features:
 * You can print an ACLEntry object. It knows how to format itself reasonably.
 * getName() method - Returns the entry name.
 * getLevel() method - Returns the entry level.
-* getRoles() method - Returns a list of entry roles, sorted alphabetically.
-* getFlags() method - Returns a list of the ACLEntry flags, translated to
+* getRoles() method - Returns a tuple of entry roles, sorted alphabetically.
+* getFlags() method - Returns a tuple of the ACLEntry flags, translated to
     strings.
+getRoles() and getFlags() returned lists before version 3.0.0. A tuple never
+compares equal to a list, so checks like entry.getRoles() == ["[R1]"] must
+compare with a tuple instead.
 These methods avoid the obvious names, e.g. getName() instead of name(),
 to avoid conflict with the existing NotesACLEntry properties.
 
@@ -330,15 +534,38 @@ Example:
     Flag : Write Public Documents
     """
 
-    __LEVELS = ["No Access", "Depositor", "Reader", "Author", "Editor", "Designer", "Manager"]
+    # One ACLEntry per ACL entry adds up; slots keep them small.
+    __slots__ = ("__handle", "__name", "__sortKey", "__level", "__roles", "__flags", "__text")
+
+    __LEVELS = ("No Access", "Depositor", "Reader", "Author", "Editor", "Designer", "Manager")
+
+    # (NotesACLEntry property, label), in display order.
+    __FLAGS = (
+        ("CanCreateDocuments", "Create Documents"),
+        ("CanDeleteDocuments", "Delete Documents"),
+        ("CanCreatePersonalAgent", "Create Personal Agents"),
+        ("CanCreatePersonalFolder", "Create Personal Folders/Views"),
+        ("CanCreateSharedFolder", "Create Shared Folders/Views"),
+        ("CanCreateLSOrJavaAgent", "Create LotusScript/Java Agent"),
+        ("IsPublicReader", "Read Public Documents"),
+        ("IsPublicWriter", "Write Public Documents"),
+    )
+    __FLAG_LABELS = tuple(label for attr, label in __FLAGS)
+    # Fetches all the flag properties in one call, looping in C.
+    __FLAG_GETTER = operator.attrgetter(*(attr for attr, label in __FLAGS))
 
     def __init__(self, notesACLEntry):
         """The parameter is a LotusScript NotesACLEntry object."""
+        # Only the name, needed for sorting, is read here. Level, roles and
+        # flags cost another ten COM reads, so they wait until asked for.
+        name = notesACLEntry.Name
         self.__handle = notesACLEntry
-        self.__name = notesACLEntry.Name
-        self.__level = self.__LEVELS[notesACLEntry.Level]
-        self.__loadRoles(notesACLEntry)
-        self.__loadFlags(notesACLEntry)
+        self.__name = name
+        self.__sortKey = name.casefold()
+        self.__level = None
+        self.__roles = None
+        self.__flags = None
+        self.__text = None
 
     def getName(self):
         """Returns the ACLEntry Name."""
@@ -346,66 +573,50 @@ Example:
 
     def getLevel(self):
         """Returns the ACLEntry Level, translated to a string."""
+        if self.__level is None:
+            self.__level = self.__LEVELS[self.__handle.Level]
         return self.__level
 
     def getFlags(self):
-        """Returns a list of the ACLEntry flags, translated to strings."""
+        """Returns a tuple of the ACLEntry flags, translated to strings."""
+        if self.__flags is None:
+            self.__loadFlags()
         return self.__flags
 
     def getRoles(self):
-        """Returns a list of the ACLEntry roles, sorted alphabetically."""
+        """Returns a tuple of the ACLEntry roles, sorted alphabetically."""
+        if self.__roles is None:
+            self.__loadRoles()
         return self.__roles
 
-    def __loadFlags(self, notesACLEntry):
-        """Translate the entry's flags into a list of strings."""
-        self.__flags = []
-        if notesACLEntry.CanCreateDocuments:
-            self.__flags.append("Create Documents")
-        if notesACLEntry.CanDeleteDocuments:
-            self.__flags.append("Delete Documents")
-        if notesACLEntry.CanCreatePersonalAgent:
-            self.__flags.append("Create Personal Agents")
-        if notesACLEntry.CanCreatePersonalFolder:
-            self.__flags.append("Create Personal Folders/Views")
-        if notesACLEntry.CanCreateSharedFolder:
-            self.__flags.append("Create Shared Folders/Views")
-        if notesACLEntry.CanCreateLSOrJavaAgent:
-            self.__flags.append("Create LotusScript/Java Agent")
-        if notesACLEntry.IsPublicReader:
-            self.__flags.append("Read Public Documents")
-        if notesACLEntry.IsPublicWriter:
-            self.__flags.append("Write Public Documents")
-
-    def __loadRoles(self, notesACLEntry):
-        """Load the entry's roles into a sorted list."""
-        roles = notesACLEntry.Roles
-        if roles:
-            self.__roles = sorted(roles)
-        else:
-            self.__roles = []
+    def __loadFlags(self):
+        """Translate the entry's flags into a tuple of strings."""
+        # Every flag property is fetched exactly once, in one pass.
+        flagBits = self.__FLAG_GETTER(self.__handle)
+        self.__flags = tuple(itertools.compress(self.__FLAG_LABELS, flagBits))
+
+    def __loadRoles(self):
+        """Load the entry's roles into a sorted tuple."""
+        roles = self.__handle.Roles
+        # The same few role names repeat across entries; intern to share them.
+        self.__roles = tuple(sorted(map(sys.intern, roles))) if roles else ()
 
     def __lt__(self, other):
         """For sorting: compare on name."""
-        return self.__name.lower() < other.__name.lower()
+        return self.__sortKey < other.__sortKey
 
     def __getattr__(self, name):
         """Delegate to the Notes object to support all properties and methods."""
-        return getattr(self.__handle, name)
+        return _delegate(self, name, "_ACLEntry__handle")
 
     def __str__(self):
         """For printing"""
-        s = "Name : %s\nLevel: %s\n" % ( self.getName(), self.getLevel() )
-        if self.getRoles():
-            for role in self.getRoles():
-                s += "Role : %s\n" % role
-        else:
-            s += "Role : No roles\n"
-        if self.getFlags():
-            for flag in self.getFlags():
-                s +=  "Flag : %s\n" % flag
-        else:
-            s += "Flag : No flags\n"
-        return s
+        # Everything printed is a snapshot, so the text is built only once.
+        if self.__text is None:
+            roles = "".join("Role : %s\n" % role for role in self.getRoles()) or "Role : No roles\n"
+            flags = "".join("Flag : %s\n" % flag for flag in self.getFlags()) or "Flag : No flags\n"
+            self.__text = "Name : %s\nLevel: %s\n%s%s" % (self.getName(), self.getLevel(), roles, flags)
+        return self.__text
 
 # end class ACLEntry
 # -------------------------------------------------------------------